@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/19 10:15
+# @Author  : flyrr
+# @File    : /cursor_chat_server.py
+# @IDE     : pycharm
+"""
+本地只读 HTTP JSON 接口，复用 export_cursor_chat 的扫描/解码逻辑
+
+接口：
+    GET /api/workspaces                              工作区列表
+    GET /api/workspaces/<workspace>/tabs             对话标签页摘要，按最后发送时间从新到旧
+    GET /api/workspaces/<workspace>/tabs/<id>/bubbles 指定标签页的气泡，<id> 为摘要中的 id
+
+所有列表接口支持 ?offset=&limit= 分页，并返回基于数据库 mtime 的 ETag。
+监听本机地址时只接受 Host 为 127.0.0.1/localhost 的请求，防止 DNS 重绑定。
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from export_cursor_chat import (GLOBAL_WORKSPACE, DEFAULT_WORKSPACE_TIMEOUT, find_global_db,
+                                read_workspace_chats, iter_chat_tabs, iter_disk_kv_tabs, describe_error)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+DEFAULT_CACHE_SIZE = 32
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+
+def db_version(db_path):
+    """
+    返回数据库的版本标识 (mtime_ns, size)
+    新版 Cursor 使用 WAL 模式，写入先落在 -wal 文件中，因此一并计入
+    """
+    version = []
+    for path in (db_path, db_path + '-wal'):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        version.extend((st.st_mtime_ns, st.st_size))
+    return tuple(version)
+
+
+def make_etag(*parts):
+    """由版本标识生成强 ETag"""
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:16]
+    return f'"{digest}"'
+
+
+class ChatStore:
+    """
+    已解码工作区的 LRU 缓存
+    缓存以数据库版本为准，版本不变时不会重新打开 SQLite 或执行 json.loads
+    """
+
+    def __init__(self, workspace_path, cache_size=DEFAULT_CACHE_SIZE):
+        self.workspace_path = workspace_path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # workspace -> (version, tabs, {id: tab})
+        self._lock = threading.Lock()
+
+    def db_path(self, workspace):
+        """返回工作区对应的数据库路径，不存在时返回 None"""
+        if workspace == GLOBAL_WORKSPACE:
+            return find_global_db(self.workspace_path)
+        if not workspace or os.path.basename(workspace) != workspace or workspace in ('.', '..'):
+            return None
+        db_path = os.path.join(self.workspace_path, workspace, 'state.vscdb')
+        return db_path if os.path.exists(db_path) else None
+
+    def list_workspaces(self):
+        """列出所有工作区及其版本，只读取文件元数据"""
+        workspaces = []
+        for workspace in sorted(os.listdir(self.workspace_path)):
+            db_path = os.path.join(self.workspace_path, workspace, 'state.vscdb')
+            if os.path.exists(db_path):
+                workspaces.append((workspace, db_version(db_path)))
+
+        global_db = find_global_db(self.workspace_path)
+        if global_db:
+            workspaces.append((GLOBAL_WORKSPACE, db_version(global_db)))
+        return workspaces
+
+    def get_tabs(self, workspace):
+        """
+        获取工作区的全部对话
+        Returns:
+            (version, tabs, {id: tab})，tabs 按最后发送时间从新到旧排列；工作区不存在时返回 None
+        """
+        db_path = self.db_path(workspace)
+        if not db_path:
+            return None
+        version = db_version(db_path)
+
+        with self._lock:
+            cached = self._cache.get(workspace)
+            if cached and cached[0] == version:
+                self._cache.move_to_end(workspace)
+                return cached
+
+        # 在锁外解码，避免大库阻塞其他请求；被锁或损坏的数据库在时间预算内失败
+        deadline = time.monotonic() + DEFAULT_WORKSPACE_TIMEOUT
+        if workspace == GLOBAL_WORKSPACE:
+            tabs = list(iter_disk_kv_tabs(db_path, deadline))
+        else:
+            tabs = [tab for _, tab in iter_chat_tabs(read_workspace_chats(workspace, db_path, deadline))]
+
+        # 以 tabId 寻址，新增对话不会改变其他对话的地址；没有 tabId 的旧数据退回到原始序号
+        by_id = {}
+        for index, tab in enumerate(tabs):
+            by_id.setdefault(str(tab.get('tabId') or index), tab)
+        tabs = sorted(by_id.items(), key=lambda item: item[1].get('lastSendTime') or 0, reverse=True)
+        entry = (version, tabs, by_id)
+
+        with self._lock:
+            self._cache[workspace] = entry
+            self._cache.move_to_end(workspace)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return entry
+
+
+def page_params(query):
+    """解析并规范化分页参数，返回 (offset, limit)"""
+    try:
+        offset = max(int(query.get('offset', ['0'])[0]), 0)
+        limit = int(query.get('limit', [str(DEFAULT_LIMIT)])[0])
+    except ValueError:
+        raise ValueError('offset 和 limit 必须是整数')
+    return offset, min(max(limit, 1), MAX_LIMIT)
+
+
+def paginate(items, query):
+    """按 offset/limit 分页，返回 (page, offset, limit)"""
+    offset, limit = page_params(query)
+    return items[offset:offset + limit], offset, limit
+
+
+def page_body(items, total, offset, limit):
+    """构造分页响应"""
+    body = {'total': total, 'offset': offset, 'limit': limit, 'items': items}
+    if offset + limit < total:
+        body['nextOffset'] = offset + limit
+    return body
+
+
+def tab_summary(tab_id, tab):
+    """对话标签页摘要，不包含气泡内容"""
+    return {
+        'id': tab_id,
+        'title': tab.get('chatTitle', ''),
+        'lastSendTime': tab.get('lastSendTime', 0),
+        'bubbleCount': len(tab.get('bubbles', [])),
+    }
+
+
+class ChatRequestHandler(BaseHTTPRequestHandler):
+    """只读 JSON 接口，store 由 make_server 注入"""
+    store = None
+    server_version = 'CursorChatExporter/1.0'
+
+    def host_allowed(self):
+        """监听本机地址时，只允许 Host 为本机名，拒绝 DNS 重绑定的网页请求"""
+        if self.server.server_address[0] not in LOOPBACK_HOSTS:
+            return True
+        host = self.headers.get('Host', '')
+        hostname = urlsplit(f"//{host}").hostname if host else None
+        return hostname in LOOPBACK_HOSTS
+
+    def do_GET(self):
+        if not self.host_allowed():
+            self.send_error_json(HTTPStatus.FORBIDDEN, 'Host 不被允许')
+            return
+
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+        query = parse_qs(url.query)
+
+        try:
+            if parts == ['api', 'workspaces']:
+                self.handle_workspaces(query)
+            elif len(parts) == 4 and parts[:2] == ['api', 'workspaces'] and parts[3] == 'tabs':
+                self.handle_tabs(parts[2], query)
+            elif (len(parts) == 6 and parts[:2] == ['api', 'workspaces']
+                  and parts[3] == 'tabs' and parts[5] == 'bubbles'):
+                self.handle_bubbles(parts[2], parts[4], query)
+            else:
+                self.send_error_json(HTTPStatus.NOT_FOUND, '接口不存在')
+        except ValueError as e:
+            self.send_error_json(HTTPStatus.BAD_REQUEST, str(e))
+        except sqlite3.Error as e:
+            self.send_error_json(HTTPStatus.SERVICE_UNAVAILABLE, describe_error(e, DEFAULT_WORKSPACE_TIMEOUT))
+        except Exception as e:
+            self.send_error_json(HTTPStatus.INTERNAL_SERVER_ERROR, f"{type(e).__name__}: {e}")
+
+    def handle_workspaces(self, query):
+        workspaces = self.store.list_workspaces()
+        items = [{'workspace': workspace} for workspace, _ in workspaces]
+        page, offset, limit = paginate(items, query)
+        etag = make_etag(workspaces, offset, limit)
+        if self.not_modified(etag):
+            return
+        self.send_json(page_body(page, len(items), offset, limit), etag)
+
+    def check_workspace(self, workspace, *parts):
+        """
+        在解码工作区之前处理条件请求：ETag 只依赖数据库版本和请求参数，
+        命中 If-None-Match 时直接返回 304，不会因缓存未命中而重新读库
+        Returns:
+            已响应（404 或 304）时返回 True
+        """
+        db_path = self.store.db_path(workspace)
+        if not db_path:
+            self.send_error_json(HTTPStatus.NOT_FOUND, '工作区不存在')
+            return True
+        return self.not_modified(make_etag(workspace, db_version(db_path), *parts))
+
+    def handle_tabs(self, workspace, query):
+        offset, limit = page_params(query)
+        if self.check_workspace(workspace, offset, limit):
+            return
+        entry = self.store.get_tabs(workspace)
+        if entry is None:
+            self.send_error_json(HTTPStatus.NOT_FOUND, '工作区不存在')
+            return
+        version, tabs, _ = entry
+        page = tabs[offset:offset + limit]
+        etag = make_etag(workspace, version, offset, limit)
+        items = [tab_summary(tab_id, tab) for tab_id, tab in page]
+        self.send_json(page_body(items, len(tabs), offset, limit), etag)
+
+    def handle_bubbles(self, workspace, tab_id, query):
+        offset, limit = page_params(query)
+        if self.check_workspace(workspace, tab_id, offset, limit):
+            return
+        entry = self.store.get_tabs(workspace)
+        if entry is None:
+            self.send_error_json(HTTPStatus.NOT_FOUND, '工作区不存在')
+            return
+        version, _, by_id = entry
+        tab = by_id.get(tab_id)
+        if tab is None:
+            self.send_error_json(HTTPStatus.NOT_FOUND, '对话不存在')
+            return
+        bubbles = tab.get('bubbles', [])
+        page = bubbles[offset:offset + limit]
+        etag = make_etag(workspace, version, tab_id, offset, limit)
+        body = page_body(page, len(bubbles), offset, limit)
+        body['tab'] = tab_summary(tab_id, tab)
+        self.send_json(body, etag)
+
+    def not_modified(self, etag):
+        """If-None-Match 命中时返回 304"""
+        if_none_match = self.headers.get('If-None-Match', '')
+        candidates = [tag.strip() for tag in if_none_match.split(',')]
+        if etag in candidates or '*' in candidates:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return True
+        return False
+
+    def send_json(self, body, etag=None, status=HTTPStatus.OK):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, message):
+        self.send_json({'error': message}, status=status)
+
+    def log_message(self, format, *args):
+        """静默访问日志"""
+        pass
+
+
+def make_server(workspace_path, host=DEFAULT_HOST, port=DEFAULT_PORT, cache_size=DEFAULT_CACHE_SIZE):
+    """创建 HTTP 服务器，每个服务器拥有独立的缓存"""
+    handler = type('BoundChatRequestHandler', (ChatRequestHandler,),
+                   {'store': ChatStore(workspace_path, cache_size)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(workspace_path, host=DEFAULT_HOST, port=DEFAULT_PORT, cache_size=DEFAULT_CACHE_SIZE):
+    """启动服务并阻塞，Ctrl+C 退出"""
+    server = make_server(workspace_path, host, port, cache_size)
+    print(f"聊天记录接口已启动: http://{host}:{server.server_address[1]}/api/workspaces")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
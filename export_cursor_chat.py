@@ -9,13 +9,21 @@ import re
 import sqlite3
 from pathlib import Path
 from datetime import datetime
+from urllib.parse import urlsplit, unquote
 import sys
 import locale
+import time
+import argparse
+import contextlib
+import shutil
+import itertools
+from collections import Counter, defaultdict
 
 
 def supports_emoji():
-    """检查终端是否支持emoji"""
-    return sys.stdout.encoding.lower() in ('utf-8', 'utf8')
+    """检查终端是否支持emoji；pythonw 或无控制台的打包程序中 sys.stdout 为 None"""
+    encoding = getattr(sys.stdout, 'encoding', None) or ''
+    return encoding.lower() in ('utf-8', 'utf8')
 
 
 class Icons:
@@ -89,72 +97,902 @@ def get_user_choice():
             print(f"\n{icons.get('error')} 无效的选项，请重新选择")
 
 
-def export_cursor_chat(export_json=False):
+CHAT_DATA_KEY = 'workbench.panel.aichat.view.aichat.chatdata'
+COMPOSER_DATA_KEY = 'composer.composerData'
+
+# 0.43 之后的版本把对话存放在全局存储的 cursorDiskKV 表中，每个对话/气泡一行
+DISK_KV_TYPE = 'cursorDiskKV'
+GLOBAL_WORKSPACE = 'globalStorage'
+COMPOSER_PREFIX = 'composerData:'
+BUBBLE_PREFIX = 'bubbleId:'
+BUBBLE_TYPES = {1: 'user', 2: 'ai'}
+
+# 单个工作区数据库的处理预算：每次尝试的秒数、被锁/忙/超时后的重试次数
+DEFAULT_WORKSPACE_TIMEOUT = 30
+DEFAULT_WORKSPACE_RETRIES = 2
+RETRY_BACKOFF = 0.5
+QUARANTINE_FILE = '_quarantine.json'
+
+
+def find_workspace_path():
+    """查找 Cursor 工作区存储目录，找不到时返回 None"""
+    home = str(Path.home())
+
+    possible_paths = [
+        os.path.join(home, 'AppData/Roaming/Cursor/User/workspaceStorage'),  # Windows路径
+        os.path.join(home, '.config/Cursor/User/workspaceStorage'),  # Linux路径
+        os.path.join(home, 'Library/Application Support/Cursor/User/workspaceStorage'),
+    ]
+
+    # 找到第一个存在的路径
+    for path in possible_paths:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def find_global_db(workspace_path):
+    """根据工作区目录定位同级 globalStorage 下的 state.vscdb，不存在时返回 None"""
+    db_path = os.path.join(os.path.dirname(os.path.normpath(workspace_path)), 'globalStorage', 'state.vscdb')
+    return db_path if os.path.exists(db_path) else None
+
+
+def connect_readonly(db_path, deadline=None):
     """
-    导出 Cursor 聊天记录
+    以只读方式打开数据库，不会与正在运行的 Cursor 争抢写锁
     Args:
-        export_json: 是否同时导出 JSON 文件，默认为 False
+        deadline: time.monotonic() 截止时间；等待锁和执行查询超过该时间时抛出 OperationalError
     """
+    timeout = max(deadline - time.monotonic(), 0) if deadline else 5.0
+    conn = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True, timeout=timeout)
+    if deadline:
+        # 返回非零值时 SQLite 中断当前语句，抛出 OperationalError: interrupted
+        conn.set_progress_handler(lambda: int(time.monotonic() > deadline), 10000)
+    return conn
+
+
+def check_deadline(deadline):
+    """语句之间的时间预算检查，与 SQLite 中断时的异常保持一致"""
+    if deadline and time.monotonic() > deadline:
+        raise sqlite3.OperationalError('interrupted')
+
+
+def read_workspace_chats(workspace, db_path, deadline=None):
+    """读取单个工作区 ItemTable 中的旧版聊天数据"""
+    chats = []
+
+    # 连接数据库
+    conn = connect_readonly(db_path, deadline)
     try:
-        # 获取用户主目录
-        home = str(Path.home())
+        cursor = conn.cursor()
+
+        # 获取所有需要的数据
+        cursor.execute("""
+           SELECT [key], value 
+           FROM ItemTable 
+           WHERE [key] IN (?, ?)
+       """, (CHAT_DATA_KEY, COMPOSER_DATA_KEY))
+
+        for row in cursor.fetchall():
+            key, value = row
+            try:
+                data = json.loads(value)
+                chats.append({
+                    'workspace': workspace,
+                    'type': key,
+                    'data': data
+                })
+            except Exception as e:
+                continue
+    finally:
+        conn.close()
+    return chats
 
-        possible_paths = [
-            os.path.join(home, 'AppData/Roaming/Cursor/User/workspaceStorage'),  # Windows路径
-            os.path.join(home, '.config/Cursor/User/workspaceStorage'),  # Linux路径
-            os.path.join(home, 'Library/Application Support/Cursor/User/workspaceStorage'),
-        ]
 
-        # 找到第一个存在的路径
-        workspace_path = None
-        for path in possible_paths:
-            if os.path.exists(path):
-                workspace_path = path
-                break
+def iter_chat_tabs(chats):
+    """遍历旧版聊天数据中的对话标签页，产出 (workspace, tab)"""
+    for chat in chats:
+        if chat['type'] == CHAT_DATA_KEY:
+            for tab in chat['data'].get('tabs', []):
+                yield chat['workspace'], tab
 
-        if not workspace_path:
-            print("找不到Cursor工作区目录")
-            return
 
-        chats = []
+def composer_owners(chats):
+    """
+    从工作区的 composer.composerData（allComposers）中取出该工作区拥有的对话
+    Returns:
+        {composerId: workspace}，用于把全局存储中的对话归回所属工作区
+    """
+    owners = {}
+    for chat in chats:
+        if chat['type'] != COMPOSER_DATA_KEY or not isinstance(chat['data'], dict):
+            continue
+        for composer in chat['data'].get('allComposers') or []:
+            if isinstance(composer, dict) and composer.get('composerId'):
+                owners[composer['composerId']] = chat['workspace']
+    return owners
+
 
-        # 遍历所有工作区文件夹
-        for workspace in os.listdir(workspace_path):
-            db_path = os.path.join(workspace_path, workspace, 'state.vscdb')
+def prefix_upper_bound(prefix):
+    """返回前缀范围查询的上界，[prefix, upper) 恰好覆盖所有以 prefix 开头的 key"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
 
-            if not os.path.exists(db_path):
+
+def iter_prefix(conn, prefix, after=None):
+    """
+    按 key 顺序流式遍历 cursorDiskKV 中以 prefix 开头的行，走 key 的唯一索引
+    after 不为空时只返回 key 大于 after 的行，用于从中断处继续
+    """
+    if after is None:
+        condition, start = '[key] >= ?', prefix
+    else:
+        condition, start = '[key] > ?', after
+    cursor = conn.execute(f"""
+        SELECT [key], value
+        FROM cursorDiskKV
+        WHERE {condition} AND [key] < ?
+        ORDER BY [key]
+    """, (start, prefix_upper_bound(prefix)))
+    for key, value in cursor:
+        if value is None:
+            continue
+        try:
+            yield key, json.loads(value)
+        except Exception:
+            continue
+
+
+def normalize_bubble(bubble):
+    """将新版气泡转换为旧版 tab['bubbles'] 的结构"""
+    normalized = {
+        'type': BUBBLE_TYPES.get(bubble.get('type'), bubble.get('type')),
+        'text': bubble.get('text') or '',
+    }
+    if bubble.get('bubbleId'):
+        normalized['id'] = bubble['bubbleId']
+    if bubble.get('selections'):
+        normalized['selections'] = bubble['selections']
+    if bubble.get('codeBlocks'):
+        normalized['codeBlocks'] = [
+            {
+                'language': block.get('language') or block.get('languageId') or '',
+                'code': block.get('code', block.get('content', '')),
+            }
+            for block in bubble['codeBlocks']
+        ]
+    return normalized
+
+
+def composer_to_tab(conn, composer_id, composer):
+    """将一个 composer 及其气泡组装成旧版 tab 结构"""
+    if composer.get('conversation'):
+        # 早期新版：气泡直接内嵌在 composerData 中
+        bubbles = composer['conversation']
+    else:
+        # 一次范围查询取出该对话的全部气泡，再按会话头的顺序排列
+        prefix = f"{BUBBLE_PREFIX}{composer_id}:"
+        by_id = {key[len(prefix):]: data for key, data in iter_prefix(conn, prefix)}
+        bubbles = []
+        for header in composer.get('fullConversationHeadersOnly', []):
+            bubble = by_id.pop(header.get('bubbleId'), None)
+            if bubble is not None:
+                bubbles.append(bubble)
+        # 会话头中缺失的气泡按 key 顺序追加，避免丢失
+        bubbles.extend(by_id.values())
+
+    return {
+        'tabId': composer_id,
+        'chatTitle': composer.get('name') or '',
+        'lastSendTime': composer.get('lastUpdatedAt') or composer.get('createdAt') or 0,
+        'bubbles': [normalize_bubble(bubble) for bubble in bubbles if isinstance(bubble, dict)],
+    }
+
+
+def iter_disk_kv_tabs(db_path, deadline=None, after=None):
+    """
+    流式读取全局存储 cursorDiskKV 中的对话
+    Args:
+        db_path: globalStorage/state.vscdb 路径
+        deadline: 见 connect_readonly
+        after: 上次已处理的 composerData key，从其后继续读取
+    Yields:
+        与旧版 chatdata 相同结构的 tab，每次只在内存中保留一个对话
+    """
+    conn = connect_readonly(db_path, deadline)
+    try:
+        has_table = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (DISK_KV_TYPE,)
+        ).fetchone()
+        if not has_table:
+            return
+
+        for key, composer in iter_prefix(conn, COMPOSER_PREFIX, after):
+            # 单个对话的查询很短，进度回调不一定触发，这里逐个对话检查时间预算
+            check_deadline(deadline)
+            if not isinstance(composer, dict):
                 continue
+            tab = composer_to_tab(conn, key[len(COMPOSER_PREFIX):], composer)
+            if tab['bubbles']:
+                yield tab
+    finally:
+        conn.close()
+
+
+def iter_workspace_sources(workspace_path):
+    """列出需要处理的数据库，产出 (workspace, db_path, 类型)"""
+    for workspace in os.listdir(workspace_path):
+        db_path = os.path.join(workspace_path, workspace, 'state.vscdb')
+        if os.path.exists(db_path):
+            yield workspace, db_path, CHAT_DATA_KEY
+
+    global_db = find_global_db(workspace_path)
+    if global_db:
+        yield GLOBAL_WORKSPACE, global_db, DISK_KV_TYPE
 
-            # 连接数据库
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-
-            # 获取所有需要的数据
-            cursor.execute("""
-               SELECT [key], value 
-               FROM ItemTable 
-               WHERE [key] IN (
-                   'workbench.panel.aichat.view.aichat.chatdata',
-                   'composer.composerData'
-               )
-           """)
-
-            for row in cursor.fetchall():
-                key, value = row
-                try:
-                    data = json.loads(value)
-                    chats.append({
-                        'workspace': workspace,
-                        'type': key,
-                        'data': data
-                    })
-                except Exception as e:
+
+def iter_source_tabs(workspace, db_path, kind, deadline=None, resume=None, owners=None):
+    """
+    读取单个数据库中的对话，产出 (续读位置, tab)
+    续读位置传回 resume 即可从该对话之后继续：全局存储为 composerData key，直接从索引处查询；
+    旧版数据整体存放在一个 JSON 中，只能重新解码后跳过前 resume + 1 个对话
+    owners 不为 None 时，读取工作区数据库的同时记录其拥有的 composer，见 composer_owners
+    """
+    if kind == DISK_KV_TYPE:
+        for tab in iter_disk_kv_tabs(db_path, deadline, resume):
+            yield f"{COMPOSER_PREFIX}{tab['tabId']}", tab
+    else:
+        chats = read_workspace_chats(workspace, db_path, deadline)
+        if owners is not None:
+            owners.update(composer_owners(chats))
+        for index, (_, tab) in enumerate(iter_chat_tabs(chats)):
+            if resume is None or index > resume:
+                yield index, tab
+
+
+def is_transient_error(error):
+    """数据库被锁、忙或超出时间预算，重试可能成功"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and any(
+        word in message for word in ('locked', 'busy', 'interrupted'))
+
+
+def describe_error(error, timeout):
+    """生成便于阅读的错误说明"""
+    if isinstance(error, sqlite3.OperationalError) and 'interrupted' in str(error).lower():
+        return f"超出时间预算 ({timeout}s)"
+    return f"{type(error).__name__}: {error}"
+
+
+def process_workspaces(workspace_path, handle_tab, timeout=DEFAULT_WORKSPACE_TIMEOUT,
+                       retries=DEFAULT_WORKSPACE_RETRIES):
+    """
+    逐个工作区处理对话，单个数据库损坏、被锁或超时不会影响其他工作区
+    只有读取数据库时的错误会触发重试和隔离；handle_tab 的错误（如写文件失败）只跳过该对话
+    Args:
+        handle_tab: 回调 handle_tab(workspace, tab)，负责写出对话；
+            全局存储中的对话按各工作区 allComposers 归属到所属工作区，找不到归属时为 globalStorage
+        timeout: 每次尝试的时间预算（秒），0 或 None 表示不限
+        retries: 数据库被锁、忙或超时后连续无进展的重试次数，重试时从最后写出的对话之后继续
+    Returns:
+        (成功处理的工作区数, 隔离的工作区列表 [{workspace, db_path, error, attempts, exported}],
+         导出失败的对话列表 [{workspace, db_path, tabId, title, error}])
+    """
+    processed = 0
+    quarantined = []
+    failed = []
+    owners = {}  # composerId -> 工作区，全局存储最后处理，此时已收集完整
+
+    for workspace, db_path, kind in iter_workspace_sources(workspace_path):
+        done = 0
+        resume = None
+        attempts = 0  # 总尝试次数
+        failures = 0  # 连续没有写出任何对话的失败次数
+        while True:
+            attempts += 1
+            progressed = False
+            deadline = time.monotonic() + timeout if timeout else None
+            try:
+                with contextlib.closing(iter_source_tabs(workspace, db_path, kind, deadline, resume, owners)) as tabs:
+                    for position, tab in tabs:
+                        owner = owners.get(tab['tabId'], workspace) if kind == DISK_KV_TYPE else workspace
+                        try:
+                            handle_tab(owner, tab)
+                        except Exception as e:
+                            # 写出失败与数据库无关，记录后继续处理后面的对话
+                            failed.append({
+                                'workspace': owner,
+                                'db_path': os.path.abspath(db_path),
+                                'tabId': tab.get('tabId'),
+                                'title': tab.get('chatTitle', ''),
+                                'error': f"{type(e).__name__}: {e}",
+                            })
+                        else:
+                            done += 1
+                        resume = position
+                        progressed = True
+                processed += 1
+                break
+            except Exception as e:
+                # 本次尝试有进展时不计入重试次数，大库可以分多次预算读完
+                failures = 0 if progressed else failures + 1
+                if failures <= retries and is_transient_error(e):
+                    time.sleep(RETRY_BACKOFF * failures)
                     continue
+                quarantined.append({
+                    'workspace': workspace,
+                    'db_path': os.path.abspath(db_path),
+                    'error': describe_error(e, timeout),
+                    'attempts': attempts,
+                    'exported': done,
+                })
+                break
 
-            conn.close()
+    return processed, quarantined, failed
 
-        if not chats:
-            print("没有找到任何聊天记录")
+
+def write_quarantine(output_dir, quarantined, failed=()):
+    """在输出目录记录本次被隔离的工作区和导出失败的对话，全部成功时删除旧记录"""
+    path = os.path.join(output_dir, QUARANTINE_FILE)
+    if quarantined or failed:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'workspaces': quarantined, 'tabs': list(failed)}, f, ensure_ascii=False, indent=2)
+    elif os.path.exists(path):
+        os.remove(path)
+    return path
+
+
+def render_tab_meta(tab, workspace):
+    """渲染对话的工作区和时间信息"""
+    timestamp = tab.get('lastSendTime', 0)
+
+    # 写入工作区信息
+    meta = f"Workspace: `{workspace}`\n\n"
+
+    # 写入时间信息
+    if timestamp:
+        meta += f"Last Updated: {timestamp}\n\n"
+    return meta
+
+
+def render_tab_header(tab, workspace, title):
+    """渲染对话的标题、工作区和时间信息"""
+    return f"# {title}\n\n" + render_tab_meta(tab, workspace)
+
+
+def render_bubble(bubble):
+    """渲染单个气泡，返回 Markdown 文本"""
+    parts = []
+
+    # 用户消息
+    if bubble.get('type') == 'user':
+        if 'text' in bubble:
+            parts.append(f"## User\n\n{bubble['text']}\n\n")
+
+        # 添加代码选择
+        if bubble.get('selections'):
+            parts.append("Selected code:\n")
+            for selection in bubble['selections']:
+                parts.append(f"```{selection.get('uri', {}).get('path', '')}\n")
+                parts.append(f"{selection.get('text', '')}\n```\n\n")
+
+    # AI消息
+    elif bubble.get('type') == 'ai':
+        if 'text' in bubble:
+            parts.append(f"## Assistant\n\n{bubble['text']}\n\n")
+
+        # 添加代码块
+        if bubble.get('codeBlocks'):
+            for code_block in bubble['codeBlocks']:
+                parts.append(f"```{code_block.get('language', '')}\n")
+                parts.append(f"{code_block.get('code', '')}\n```\n\n")
+
+    return ''.join(parts)
+
+
+def write_tab_markdown(f, tab, workspace, title):
+    """将单个对话写入 Markdown 文件对象"""
+    f.write(render_tab_header(tab, workspace, title))
+
+    # 写入对话内容
+    for bubble in tab.get('bubbles', []):
+        f.write(render_bubble(bubble))
+
+
+def part_path(md_path, number):
+    """分页文件路径：<主干>.partNNN.md"""
+    stem, _ = os.path.splitext(md_path)
+    return f"{stem}.part{number:03d}.md"
+
+
+def remove_stale_pages(md_path, start=1):
+    """删除上次导出遗留的、从第 start 页开始的分页文件"""
+    number = start
+    while os.path.exists(part_path(md_path, number)):
+        os.remove(part_path(md_path, number))
+        number += 1
+
+
+class PagedMarkdownWriter:
+    """
+    分页写入 Markdown：气泡数或字节数达到阈值时切换到下一页
+    第一页先按普通格式直接写入 md_path，只有真正需要第二页时才改名为 part001，
+    未超过阈值的对话与不分页的输出完全一致且只写一次；
+    每页写满即关闭，内存占用只与单个气泡有关；分页时最后在 md_path 生成目录页
+    """
+
+    def __init__(self, md_path, tab, workspace, title, page_bubbles=None, page_bytes=None):
+        self.md_path = md_path
+        self.tab = tab
+        self.workspace = workspace
+        self.title = title
+        self.page_bubbles = page_bubbles
+        self.page_bytes = page_bytes
+
+        self.index_name = os.path.basename(md_path)
+        self.pages = []  # [(path, 起始气泡序号, 气泡数, 字节数)]
+        self._file = None
+        self._bubble_count = 0
+        self._byte_count = 0
+        self._total_bubbles = 0
+        self._header_bytes = 0  # 第一页文档头的字节数，改写为 part001 时替换
+
+    def _page_full(self, size):
+        """当前页已有内容且再写入 size 字节会超出阈值"""
+        if not self._bubble_count:
+            return False
+        if self.page_bubbles and self._bubble_count >= self.page_bubbles:
+            return True
+        return bool(self.page_bytes) and self._byte_count + size > self.page_bytes
+
+    def _part_header(self, number):
+        """分页文件的标题和目录页链接"""
+        return f"# {self.title} (Part {number})\n\n[Index](<{self.index_name}>)\n\n"
+
+    def _open_page(self):
+        number = len(self.pages) + 1
+        path = self.md_path if number == 1 else part_path(self.md_path, number)
+        self._file = open(path, 'w', encoding='utf-8')
+        self.pages.append([path, self._total_bubbles + 1, 0, 0])
+        self._bubble_count = 0
+        self._byte_count = 0
+
+        if number == 1:
+            self._write(render_tab_header(self.tab, self.workspace, self.title))
+            self._header_bytes = self._byte_count
+        else:
+            self._write(self._part_header(number))
+
+    def _close_page(self, has_next):
+        number = len(self.pages)
+        links = []
+        if number > 1:
+            links.append(f"[Previous](<{os.path.basename(part_path(self.md_path, number - 1))}>)")
+        if has_next:
+            links.append(f"[Next](<{os.path.basename(part_path(self.md_path, number + 1))}>)")
+        if links:
+            self._write("---\n\n" + " · ".join(links) + "\n")
+        self._file.close()
+        self._file = None
+        self.pages[-1][2] = self._bubble_count
+        self.pages[-1][3] = self._byte_count
+
+        if has_next and number == 1:
+            self._promote_first_page()
+
+    def _promote_first_page(self):
+        """
+        需要第二页了：第一页让出 md_path，留给最后生成的目录页
+        改写为 part001，并把完整的文档头换成与其他分页一致的分页标题和目录页链接
+        """
+        first = part_path(self.md_path, 1)
+        header = self._part_header(1).encode('utf-8')
+        with open(self.md_path, 'rb') as src, open(first, 'wb') as dst:
+            dst.write(header)
+            src.seek(self._header_bytes)
+            shutil.copyfileobj(src, dst)
+        os.remove(self.md_path)
+        self.pages[0][0] = first
+        self.pages[0][3] += len(header) - self._header_bytes
+
+    def _write(self, text):
+        self._file.write(text)
+        self._byte_count += len(text.encode('utf-8'))
+
+    def write_bubble(self, bubble):
+        chunk = render_bubble(bubble)
+        if not chunk:
+            return
+        size = len(chunk.encode('utf-8'))
+        if self._file is not None and self._page_full(size):
+            self._close_page(has_next=True)
+        if self._file is None:
+            self._open_page()
+        self._write(chunk)
+        self._bubble_count += 1
+        self._total_bubbles += 1
+
+    def close(self):
+        """结束写入并生成目录页，返回页数"""
+        if self._file is None and not self.pages:
+            # 没有任何气泡，写出只含标题的文件
+            with open(self.md_path, 'w', encoding='utf-8') as f:
+                f.write(render_tab_header(self.tab, self.workspace, self.title))
+            remove_stale_pages(self.md_path)
+            return 1
+        if self._file is not None:
+            self._close_page(has_next=False)
+
+        if len(self.pages) == 1:
+            # 只有一页，md_path 已是完整的普通格式输出
+            remove_stale_pages(self.md_path)
+            return 1
+
+        with open(self.md_path, 'w', encoding='utf-8') as f:
+            f.write(render_tab_header(self.tab, self.workspace, self.title))
+            f.write(f"{self._total_bubbles} messages in {len(self.pages)} parts:\n\n")
+            for number, (path, first, count, size) in enumerate(self.pages, 1):
+                f.write(f"- [Part {number}](<{os.path.basename(path)}>) "
+                        f"— messages {first}-{first + count - 1}, {size / 1024:.1f} KB\n")
+        remove_stale_pages(self.md_path, len(self.pages) + 1)
+        return len(self.pages)
+
+
+def write_tab_pages(md_path, tab, workspace, title, page_bubbles=None, page_bytes=None):
+    """
+    导出单个对话的 Markdown，可按阈值分页
+    Args:
+        page_bubbles: 每页最多气泡数，None 或 0 表示不限
+        page_bytes: 每页最大字节数（单个超大气泡独占一页），None 或 0 表示不限
+    Returns:
+        写出的页数（不分页时为 1）
+    """
+    if not page_bubbles and not page_bytes:
+        with open(md_path, 'w', encoding='utf-8') as f:
+            write_tab_markdown(f, tab, workspace, title)
+        # 之前以分页方式导出过时，清理遗留的分页文件
+        remove_stale_pages(md_path)
+        return 1
+
+    writer = PagedMarkdownWriter(md_path, tab, workspace, title, page_bubbles, page_bytes)
+    for bubble in tab.get('bubbles', []):
+        writer.write_bubble(bubble)
+    return writer.close()
+
+
+def tab_to_json(tab, workspace, title):
+    """创建单个对话的 JSON 数据"""
+    return {
+        'workspace': workspace,
+        'title': title,
+        'lastSendTime': tab.get('lastSendTime', 0),
+        'bubbles': tab.get('bubbles', [])
+    }
+
+
+# 输出目录布局预设，也可直接传入模板，可用字段: {workspace} {year} {month} {day}
+LAYOUT_PRESETS = {
+    'flat': '',
+    'workspace': '{workspace}',
+    'date': '{year}/{month}',
+    'workspace-date': '{workspace}/{year}/{month}',
+}
+
+
+def read_workspace_name(workspace_dir):
+    """从 workspace.json 中读取工作区对应的项目名，读取失败时返回 None"""
+    try:
+        with open(os.path.join(workspace_dir, 'workspace.json'), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    uri = data.get('folder') or data.get('workspace') if isinstance(data, dict) else None
+    if not isinstance(uri, str):
+        return None
+    name = os.path.basename(unquote(urlsplit(uri).path).rstrip('/'))
+    if name.endswith('.code-workspace'):
+        name = name[:-len('.code-workspace')]
+    return name or None
+
+
+class OutputLayout:
+    """
+    计算对话的输出位置：按布局模板分区，并保证同一次导出中文件名不重复
+    工作区名在首次使用时从各工作区的 workspace.json 解析一次并缓存；
+    不同工作区同名时追加工作区 ID 前缀以区分
+    """
+
+    def __init__(self, workspace_path, layout='flat'):
+        self.workspace_path = workspace_path
+        self.template = LAYOUT_PRESETS.get(layout, layout).strip('/')
+        try:
+            self.template.format(workspace='w', year='y', month='m', day='d')
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"无效的目录布局: {layout} ({e})")
+        self._workspace_names = None
+        self._used = set()  # 已分配的 (目录, 小写文件名主干)，按不区分大小写处理以兼容 NTFS/APFS
+        self._next_suffix = {}  # (目录, 小写文件名主干) -> 下一个尝试的数字后缀
+        self._created = set()  # 已创建的目录
+
+    def workspace_name(self, workspace):
+        """返回工作区的可读目录名"""
+        if self._workspace_names is None:
+            names = {}
+            for entry in os.listdir(self.workspace_path):
+                entry_dir = os.path.join(self.workspace_path, entry)
+                if os.path.isdir(entry_dir):
+                    names[entry] = sanitize_filename(read_workspace_name(entry_dir) or entry)
+            counts = Counter(name.lower() for name in names.values())
+            self._workspace_names = {
+                entry: name if counts[name.lower()] == 1 else f"{name}_{entry[:8]}"
+                for entry, name in names.items()
+            }
+        return self._workspace_names.get(workspace) or sanitize_filename(workspace)
+
+    def partition(self, workspace, timestamp):
+        """返回对话所在的相对目录"""
+        if not self.template:
+            return ''
+        try:
+            dt = datetime.fromtimestamp(timestamp / 1000) if timestamp else None
+        except (OverflowError, OSError, ValueError):
+            dt = None
+        fields = {
+            'year': f"{dt:%Y}" if dt else 'unknown',
+            'month': f"{dt:%m}" if dt else 'unknown',
+            'day': f"{dt:%d}" if dt else 'unknown',
+        }
+        if '{workspace}' in self.template:
+            fields['workspace'] = self.workspace_name(workspace)
+        return os.path.join(*self.template.format(**fields).split('/'))
+
+    def allocate(self, workspace, tab, stem):
+        """
+        为对话分配不重复的相对路径主干（不含扩展名）
+        重名时优先追加对话 ID 前缀，使重复导出时的文件名保持稳定
+        """
+        directory = self.partition(workspace, tab.get('lastSendTime', 0))
+        candidates = [stem]
+        if tab.get('tabId'):
+            candidates.append(f"{stem}_{str(tab['tabId'])[:8]}")
+        for candidate in candidates:
+            key = (directory, candidate.lower())
+            if key not in self._used:
+                self._used.add(key)
+                return os.path.join(directory, candidate)
+
+        # 仍然重名时追加数字后缀，从上次用到的位置继续，大量同名对话也不会反复从 2 开始尝试
+        base = (directory, stem.lower())
+        for n in itertools.count(self._next_suffix.get(base, 2)):
+            candidate = f"{stem}_{n}"
+            key = (directory, candidate.lower())
+            if key not in self._used:
+                self._used.add(key)
+                self._next_suffix[base] = n + 1
+                return os.path.join(directory, candidate)
+
+    def path(self, root, relative_stem, ext):
+        """返回输出文件路径，按需创建目录"""
+        path = os.path.join(root, relative_stem + ext)
+        directory = os.path.dirname(path)
+        if directory not in self._created:
+            os.makedirs(directory, exist_ok=True)
+            self._created.add(directory)
+        return path
+
+
+# 默认脱敏规则：规则名 -> {pattern: 正则, anchors: 命中时必然出现的字面量（不区分大小写）}
+# 规则文件可追加规则（如内部主机名）、覆盖同名规则，或以 null 关闭默认规则
+DEFAULT_REDACTION_RULES = {
+    'private_key': {
+        'pattern': r'-----BEGIN [A-Z ]*PRIVATE KEY-----[\s\S]*?-----END [A-Z ]*PRIVATE KEY-----',
+        'anchors': ['-----begin'],
+    },
+    'openai_key': {
+        'pattern': r'(?<![\w-])sk-[A-Za-z0-9_-]{20,}',
+        'anchors': ['sk-'],
+    },
+    'aws_access_key': {
+        'pattern': r'\b(?:AKIA|ASIA)[0-9A-Z]{16}\b',
+        'anchors': ['akia', 'asia'],
+    },
+    'github_token': {
+        'pattern': r'\b(?:gh[pousr]_[A-Za-z0-9]{36,}|github_pat_[A-Za-z0-9_]{22,})',
+        'anchors': ['ghp_', 'gho_', 'ghu_', 'ghs_', 'ghr_', 'github_pat_'],
+    },
+    'slack_token': {
+        'pattern': r'\bxox[abprs]-[A-Za-z0-9-]{10,}',
+        'anchors': ['xox'],
+    },
+    'google_api_key': {
+        'pattern': r'\bAIza[0-9A-Za-z_-]{35}',
+        'anchors': ['aiza'],
+    },
+    'jwt': {
+        'pattern': r'\beyJ[A-Za-z0-9_-]{10,}\.[A-Za-z0-9_-]{10,}\.[A-Za-z0-9_-]{10,}',
+        'anchors': ['eyj'],
+    },
+    'bearer_token': {
+        'pattern': r'(?i:bearer)\s+[A-Za-z0-9._~+/-]{20,}=*',
+        'anchors': ['bearer'],
+    },
+    'secret_assignment': {
+        'pattern': r'(?i:api[_-]?key|secret|token|passw(?:or)?d)["\']?\s*[:=]\s*["\']?[^\s"\']{8,}',
+        'anchors': ['api_key', 'api-key', 'apikey', 'secret', 'token', 'passw'],
+    },
+}
+
+
+def load_redaction_rules(rules_path=None):
+    """
+    加载脱敏规则，规则文件为 JSON 对象：
+        {"规则名": "正则"} 或 {"规则名": {"pattern": "正则", "anchors": ["字面量", ...]}}
+    规则文件中的规则会覆盖同名默认规则，值为 null 时关闭该默认规则；
+    未提供 anchors 的规则对每个字段都会执行
+    """
+    rules = dict(DEFAULT_REDACTION_RULES)
+    if rules_path:
+        with open(rules_path, 'r', encoding='utf-8') as f:
+            custom = json.load(f)
+        if not isinstance(custom, dict):
+            raise ValueError(f"脱敏规则文件格式错误，应为 JSON 对象: {rules_path}")
+        for name, rule in custom.items():
+            if rule is None:
+                rules.pop(name, None)
+            elif isinstance(rule, str):
+                rules[name] = {'pattern': rule, 'anchors': []}
+            elif isinstance(rule, dict) and isinstance(rule.get('pattern'), str):
+                rules[name] = {'pattern': rule['pattern'], 'anchors': list(rule.get('anchors') or [])}
+            else:
+                raise ValueError(f"脱敏规则 {name} 格式错误: {rule!r}")
+    return rules
+
+
+# 字符按在文本和代码中出现的频率从高到低排列，用于为锚点挑选最罕见的字符作为预筛选条件
+CHAR_FREQUENCY = ' etaoinsrhldcumfpgwybvkxjqz'
+
+
+def rarest_char(anchor):
+    """返回锚点中最罕见的字符，不在频率表中的字符（符号、非 ASCII）视为最罕见"""
+    return max(anchor, key=lambda c: CHAR_FREQUENCY.find(c) % (len(CHAR_FREQUENCY) + 1))
+
+
+class Redactor:
+    """
+    把脱敏规则组合成一个正则，对每个文本字段只做一次匹配扫描
+
+    Python 的 re 没有多模式自动机，所有规则直接拼成一个大正则比逐条扫描还慢
+    （见 benchmarks/bench_redaction.py）。因此先用字面量包含判断（C 实现）筛出字段中
+    可能命中的规则，再用这些规则组合成的正则扫描一次；组合结果按规则子集缓存。
+    锚点按其中最罕见的字符分桶，字段中没有该字符时整桶跳过，大多数字段只需几次单字符查找。
+    """
+
+    def __init__(self, rules=None):
+        rules = DEFAULT_REDACTION_RULES if rules is None else rules
+        self.rules = []  # [(规则名, 已编译正则)]
+        self.anchors = defaultdict(list)  # 锚点中最罕见的字符 -> [(小写锚点, 规则下标)]
+        self.unanchored = []  # 没有锚点、总是执行的规则下标
+        for index, (name, rule) in enumerate(rules.items()):
+            try:
+                self.rules.append((name, re.compile(rule['pattern'])))
+            except re.error as e:
+                raise ValueError(f"脱敏规则 {name} 无效: {e}")
+            anchors = [anchor.lower() for anchor in rule.get('anchors') or [] if anchor]
+            for anchor in anchors:
+                self.anchors[rarest_char(anchor)].append((anchor, index))
+            if not anchors:
+                self.unanchored.append(index)
+        self.anchors = list(self.anchors.items())
+        self.min_anchor = min((len(anchor) for _, anchors in self.anchors for anchor, _ in anchors), default=0)
+
+        # 导出时按字段命中的规则子集组合正则，这里先组合全部规则，
+        # 保证任何子集都能组合，规则问题在写出任何文件之前报告
+        try:
+            re.compile('|'.join(f"(?:{pattern.pattern})" for _, pattern in self.rules))
+        except re.error as e:
+            raise ValueError(f"脱敏规则无法组合（请用 (?i:...) 代替全局标志 (?i)）: {e}")
+        self._matchers = {}  # 命中规则下标 -> (组合正则, 规则列表)
+        self.counts = defaultdict(Counter)  # workspace -> {规则名: 次数}
+
+    def matcher(self, text):
+        """返回适用于 text 的组合正则及其规则，没有可能命中的规则时返回 None"""
+        if len(text) < self.min_anchor and not self.unanchored:
+            return None
+        lowered = text.lower()
+        active = {index for char, anchors in self.anchors if char in lowered
+                  for anchor, index in anchors if anchor in lowered}
+        if not active and not self.unanchored:
+            return None
+        active = tuple(sorted(active.union(self.unanchored)))
+
+        matcher = self._matchers.get(active)
+        if matcher is None:
+            rules = [self.rules[index] for index in active]
+            if len(rules) == 1:
+                combined = rules[0][1]
+            else:
+                combined = re.compile('|'.join(f"(?:{pattern.pattern})" for _, pattern in rules))
+            matcher = self._matchers[active] = (combined, rules)
+        return matcher
+
+    def redact(self, text, counter):
+        """替换 text 中命中的敏感信息，命中次数累加到 counter"""
+        if not text or not isinstance(text, str):
+            return text
+        matcher = self.matcher(text)
+        if matcher is None:
+            return text
+        combined, rules = matcher
+
+        def replace(match):
+            # 组合正则按顺序尝试各分支，这里同样按顺序找到第一个在该位置命中的规则
+            name = 'secret'
+            for rule_name, pattern in rules:
+                m = pattern.match(match.string, match.start())
+                if m and m.end() == match.end():
+                    name = rule_name
+                    break
+            counter[name] += 1
+            return f"[REDACTED:{name}]"
+
+        redacted, count = combined.subn(replace, text)
+        return redacted if count else text
+
+    def redact_value(self, value, counter):
+        """
+        递归替换 dict/list 中所有字符串值，rawText、initText 等未知字段同样覆盖
+        只复制发生替换的路径，没有命中的字段和容器原样返回
+        """
+        if isinstance(value, str):
+            return self.redact(value, counter)
+        if isinstance(value, dict):
+            redacted = None
+            for key, item in value.items():
+                new_item = self.redact_value(item, counter)
+                if new_item is not item:
+                    if redacted is None:
+                        redacted = dict(value)
+                    redacted[key] = new_item
+            return value if redacted is None else redacted
+        if isinstance(value, list):
+            redacted = None
+            for i, item in enumerate(value):
+                new_item = self.redact_value(item, counter)
+                if new_item is not item:
+                    if redacted is None:
+                        redacted = list(value)
+                    redacted[i] = new_item
+            return value if redacted is None else redacted
+        return value
+
+    def redact_tab(self, tab, workspace):
+        """返回脱敏后的对话副本，不修改原数据；JSON 导出原样写出气泡，因此脱敏整个对话的所有字段"""
+        return self.redact_value(tab, self.counts[workspace])
+
+    def summary(self):
+        """按工作区汇总脱敏次数，返回 [(workspace, 总次数, Counter)]"""
+        return [(workspace, sum(counter.values()), counter)
+                for workspace, counter in self.counts.items() if counter]
+
+
+def export_cursor_chat(export_json=False, page_bubbles=None, page_bytes=None, redactor=None,
+                       workspace_path=None, timeout=DEFAULT_WORKSPACE_TIMEOUT, retries=DEFAULT_WORKSPACE_RETRIES,
+                       layout='flat'):
+    """
+    导出 Cursor 聊天记录
+    Args:
+        export_json: 是否同时导出 JSON 文件，默认为 False
+        page_bubbles: 超过该气泡数时分页导出 Markdown，默认不分页
+        page_bytes: 超过该字节数时分页导出 Markdown，默认不分页
+        redactor: Redactor 实例，提供时在写出前对敏感信息脱敏
+        workspace_path: Cursor 工作区存储目录，默认自动检测
+        timeout: 单个工作区每次尝试的时间预算（秒）
+        retries: 单个工作区被锁或超时后的重试次数
+        layout: 输出目录布局，LAYOUT_PRESETS 中的预设名或模板，默认全部放在同一目录
+    """
+    try:
+        workspace_path = workspace_path or find_workspace_path()
+        if not workspace_path:
+            print("找不到Cursor工作区目录")
             return
 
         # 创建输出目录
@@ -165,108 +1003,145 @@ def export_cursor_chat(export_json=False):
             json_output_dir = 'cursor_chats_json'
             os.makedirs(json_output_dir, exist_ok=True)
 
+        output_layout = OutputLayout(workspace_path, layout)
+
         # 记录统计信息
-        total_chats = len(chats)
-        total_tabs = 0
-        md_count = 0
-        json_count = 0
-
-        # 遍历并导出每个对话
-        for chat in chats:
-            if chat['type'] == 'workbench.panel.aichat.view.aichat.chatdata':
-                data = chat['data']
-                if 'tabs' in data:
-                    total_tabs += len(data['tabs'])
-                    for tab in data['tabs']:
-                        # 获取对话标题和时间戳
-                        title = tab.get('chatTitle', '')
-                        timestamp = tab.get('lastSendTime', 0)
-                        if not title:
-                            title = f"{format_timestamp(timestamp)}_Untitled_Chat" if timestamp else "Untitled_Chat"
-
-                        # 清理文件名
-                        safe_title = sanitize_filename(title)
-                        time_str = format_timestamp(timestamp)
-
-                        # 导出 Markdown 文件
-                        md_filename = f"{time_str}_{safe_title}.md"
-                        md_path = os.path.join(md_output_dir, md_filename)
-
-                        with open(md_path, 'w', encoding='utf-8') as f:
-                            # 写入标题
-                            f.write(f"# {title}\n\n")
-
-                            # 写入工作区信息
-                            f.write(f"Workspace: `{chat['workspace']}`\n\n")
-
-                            # 写入时间信息
-                            if timestamp:
-                                f.write(f"Last Updated: {timestamp}\n\n")
-
-                            # 写入对话内容
-                            if 'bubbles' in tab:
-                                for bubble in tab['bubbles']:
-                                    # 用户消息
-                                    if bubble.get('type') == 'user':
-                                        if 'text' in bubble:
-                                            f.write(f"## User\n\n{bubble['text']}\n\n")
-
-                                        # 添加代码选择
-                                        if bubble.get('selections'):
-                                            f.write("Selected code:\n")
-                                            for selection in bubble['selections']:
-                                                f.write(f"```{selection.get('uri', {}).get('path', '')}\n")
-                                                f.write(f"{selection.get('text', '')}\n```\n\n")
-
-                                    # AI消息
-                                    elif bubble.get('type') == 'ai':
-                                        if 'text' in bubble:
-                                            f.write(f"## Assistant\n\n{bubble['text']}\n\n")
-
-                                        # 添加代码块
-                                        if bubble.get('codeBlocks'):
-                                            for code_block in bubble['codeBlocks']:
-                                                f.write(f"```{code_block.get('language', '')}\n")
-                                                f.write(f"{code_block.get('code', '')}\n```\n\n")
-
-                        # 可选：导出 JSON 文件
-                        if export_json:
-                            json_filename = f"{time_str}_{safe_title}.json"
-                            json_path = os.path.join(json_output_dir, json_filename)
-
-                            # 创建单个对话的 JSON 数据
-                            chat_data = {
-                                'workspace': chat['workspace'],
-                                'title': title,
-                                'lastSendTime': timestamp,
-                                'bubbles': tab.get('bubbles', [])
-                            }
-
-                            with open(json_path, 'w', encoding='utf-8') as f:
-                                json.dump(chat_data, f, ensure_ascii=False, indent=2)
-                            json_count += 1
-
-                        md_count += 1
-
-        # 关闭数据库连接
-        conn.close()
+        stats = Counter()
+
+        def export_tab(workspace, tab):
+            """导出单个对话"""
+            if redactor:
+                tab = redactor.redact_tab(tab, workspace)
+
+            # 获取对话标题和时间戳
+            title = tab.get('chatTitle', '')
+            timestamp = tab.get('lastSendTime', 0)
+            if not title:
+                title = f"{format_timestamp(timestamp)}_Untitled_Chat" if timestamp else "Untitled_Chat"
+
+            # 清理文件名
+            safe_title = sanitize_filename(title)
+            time_str = format_timestamp(timestamp)
+
+            # 导出 Markdown 文件
+            stem = output_layout.allocate(workspace, tab, f"{time_str}_{safe_title}")
+            md_path = output_layout.path(md_output_dir, stem, '.md')
+
+            page_count = write_tab_pages(md_path, tab, workspace, title, page_bubbles, page_bytes)
+            if page_count > 1:
+                stats['paged'] += 1
+
+            # 可选：导出 JSON 文件
+            if export_json:
+                json_path = output_layout.path(json_output_dir, stem, '.json')
+
+                with open(json_path, 'w', encoding='utf-8') as f:
+                    json.dump(tab_to_json(tab, workspace, title), f, ensure_ascii=False, indent=2)
+                stats['json'] += 1
+
+            stats['md'] += 1
+            stats['tabs'] += 1
+
+        # 逐个工作区导出，失败的工作区被隔离而不中断整个导出
+        processed, quarantined, failed = process_workspaces(workspace_path, export_tab, timeout, retries)
+        quarantine_path = write_quarantine(md_output_dir, quarantined, failed)
+
+        if quarantined:
+            print(f"\n{icons.get('error')} {len(quarantined)} 个工作区处理失败，已跳过:")
+            for item in quarantined:
+                print(f"  {item['workspace']}: {item['error']} (尝试 {item['attempts']} 次)")
+        if failed:
+            print(f"\n{icons.get('error')} {len(failed)} 个对话导出失败，已跳过:")
+            for item in failed:
+                print(f"  {item['workspace']}/{item['tabId']}: {item['error']}")
+        if quarantined or failed:
+            print(f"  详情见 {os.path.abspath(quarantine_path)}")
+
+        if not stats['tabs']:
+            print("没有找到任何聊天记录")
+            return not (quarantined or failed)
 
         # 输出统计信息
         print(f"\n{icons.get('success')} 导出完成!")
-        print(f"- 找到 {total_chats} 个聊天记录")
-        print(f"- 包含 {total_tabs} 个对话标签页")
-        print(f"{icons.get('folder')} Markdown文件位置: {os.path.abspath(md_output_dir)} ({md_count} 个)")
+        print(f"- 处理 {processed} 个工作区数据库")
+        print(f"- 包含 {stats['tabs']} 个对话标签页")
+        print(f"{icons.get('folder')} Markdown文件位置: {os.path.abspath(md_output_dir)} ({stats['md']} 个)")
+        if stats['paged']:
+            print(f"- 其中 {stats['paged']} 个大型对话已分页导出")
         if export_json:
-            print(f"{icons.get('folder')} JSON文件位置: {os.path.abspath(json_output_dir)} ({json_count} 个)")
+            print(f"{icons.get('folder')} JSON文件位置: {os.path.abspath(json_output_dir)} ({stats['json']} 个)")
+        if redactor:
+            redactions = redactor.summary()
+            print(f"- 脱敏 {sum(total for _, total, _ in redactions)} 处敏感信息")
+            for workspace, total, counter in redactions:
+                details = ', '.join(f"{name}: {count}" for name, count in counter.most_common())
+                print(f"  {workspace}: {total} ({details})")
+
+        # 部分工作区或对话失败时返回 False，命令行以非零状态退出
+        return not (quarantined or failed)
 
     except Exception as e:
         print(f"\n{icons.get('error')} 发生错误: {e}")
         return False
+
+
+def parse_args(argv):
+    """解析命令行参数，不带参数时进入交互模式"""
+    parser = argparse.ArgumentParser(description='Cursor Chat Exporter')
+    subparsers = parser.add_subparsers(dest='command')
+
+    export_parser = subparsers.add_parser('export', help='非交互式导出')
+    export_parser.add_argument('--json', action='store_true', help='同时导出 JSON 文件')
+    export_parser.add_argument('--path', help='Cursor 工作区存储目录 (默认自动检测)')
+    export_parser.add_argument('--page-bubbles', type=int, help='单页最多气泡数，超过后分页导出')
+    export_parser.add_argument('--page-bytes', type=int, help='单页最大字节数，超过后分页导出')
+    export_parser.add_argument('--layout', default='flat',
+                               help=f"输出目录布局: {', '.join(LAYOUT_PRESETS)} 或模板如 '{{workspace}}/{{year}}' (默认: flat)")
+    export_parser.add_argument('--timeout', type=float, default=DEFAULT_WORKSPACE_TIMEOUT,
+                               help=f'单个工作区每次尝试的时间预算，秒 (默认: {DEFAULT_WORKSPACE_TIMEOUT}，0 为不限)')
+    export_parser.add_argument('--retries', type=int, default=DEFAULT_WORKSPACE_RETRIES,
+                               help=f'工作区被锁或超时后连续无进展的重试次数 (默认: {DEFAULT_WORKSPACE_RETRIES})')
+    export_parser.add_argument('--redact', action='store_true', help='导出前对密钥、令牌等敏感信息脱敏')
+    export_parser.add_argument('--redact-rules', help='自定义脱敏规则 JSON 文件，指定后自动启用脱敏')
+
+    serve_parser = subparsers.add_parser('serve', help='启动本地只读 HTTP JSON 接口')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='监听地址 (默认: 127.0.0.1)')
+    serve_parser.add_argument('--port', type=int, default=8765, help='监听端口 (默认: 8765)')
+    serve_parser.add_argument('--path', help='Cursor 工作区存储目录 (默认自动检测)')
+    serve_parser.add_argument('--cache-size', type=int, default=32, help='缓存的已解码工作区数量 (默认: 32)')
+
+    return parser.parse_args(argv)
+
+
+def run_command(args):
+    """执行命令行子命令"""
+    if args.command == 'export':
+        redactor = None
+        if args.redact or args.redact_rules:
+            try:
+                redactor = Redactor(load_redaction_rules(args.redact_rules))
+            except (OSError, ValueError) as e:
+                print(f"{icons.get('error')} {e}")
+                return False
+        return export_cursor_chat(args.json, args.page_bubbles, args.page_bytes, redactor, args.path,
+                                  args.timeout, args.retries, args.layout)
+    if args.command == 'serve':
+        from cursor_chat_server import serve
+
+        workspace_path = args.path or find_workspace_path()
+        if not workspace_path or not os.path.exists(workspace_path):
+            print(f"{icons.get('error')} 找不到Cursor工作区目录")
+            return False
+        serve(workspace_path, args.host, args.port, args.cache_size)
     return True
 
 
 def main():
     """主函数"""
+    if len(sys.argv) > 1:
+        success = run_command(parse_args(sys.argv[1:]))
+        sys.exit(0 if success else 1)
+
     print_banner()
 
     while True:
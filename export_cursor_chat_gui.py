@@ -6,19 +6,21 @@
 import os
 import json
 import re
-import sqlite3
 from pathlib import Path
 from datetime import datetime
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QPushButton, QLabel, QCheckBox,
                              QTextEdit, QProgressBar, QMessageBox, QFileDialog,
-                             QFrame, QDialog, QLineEdit)
+                             QFrame, QDialog, QLineEdit, QSpinBox, QComboBox)
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 from PyQt6.QtGui import QFont
 
 import sys
 import platform
 
+from export_cursor_chat import (process_workspaces, write_quarantine, write_tab_pages, tab_to_json, Redactor,
+                                OutputLayout, DEFAULT_WORKSPACE_TIMEOUT, DEFAULT_WORKSPACE_RETRIES)
+
 
 def sanitize_filename(filename):
     """清理文件名，移除非法字符，限制长度"""
@@ -98,11 +100,59 @@ class ExportWorker(QThread):
     progress = pyqtSignal(str)  # 进度信号
     finished = pyqtSignal(bool, str)  # 完成信号：(是否成功, 消息)
 
-    def __init__(self, workspace_path, export_json=False, include_timestamp=True):
+    def __init__(self, workspace_path, export_json=False, include_timestamp=True, page_bubbles=0, redact=False,
+                 timeout=DEFAULT_WORKSPACE_TIMEOUT, retries=DEFAULT_WORKSPACE_RETRIES, layout='flat'):
         super().__init__()
         self.workspace_path = workspace_path
         self.export_json = export_json
         self.include_timestamp = include_timestamp
+        self.page_bubbles = page_bubbles
+        self.redactor = Redactor() if redact else None
+        self.timeout = timeout
+        self.retries = retries
+        self.layout = layout
+        self.output_layout = None
+        self.md_output_dir = 'cursor_chats'
+        self.json_output_dir = 'cursor_chats_json'
+        self.md_count = 0
+        self.json_count = 0
+
+    def export_tab(self, workspace, tab):
+        """导出单个对话"""
+        if self.redactor:
+            tab = self.redactor.redact_tab(tab, workspace)
+
+        # 获取对话标题和时间戳
+        title = tab.get('chatTitle', '')
+        timestamp = tab.get('lastSendTime', 0)
+        time_str = format_timestamp(timestamp)
+
+        if not title:
+            title = f"Chat_{time_str}"
+
+        # 清理文件名
+        safe_title = sanitize_filename(title)
+
+        # 获取时间戳字符串
+        time_str = format_timestamp(timestamp) if self.include_timestamp else ""
+
+        # 处理 Markdown 文件名，按布局分区且同名文件不会互相覆盖
+        stem = self.output_layout.allocate(workspace, tab, f"{time_str}_{safe_title}" if time_str else safe_title)
+        md_path = self.output_layout.path(self.md_output_dir, stem, '.md')
+
+        # 导出 Markdown 文件
+        write_tab_pages(md_path, tab, workspace, title, self.page_bubbles)
+
+        # 可选：导出 JSON 文件
+        if self.export_json:
+            json_path = self.output_layout.path(self.json_output_dir, stem, '.json')
+
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(tab_to_json(tab, workspace, title), f, ensure_ascii=False, indent=2)
+            self.json_count += 1
+
+        self.md_count += 1
+        self.progress.emit(f"📝 已导出: {self.md_count} 个文件...")
 
     def run(self):
         try:
@@ -110,150 +160,45 @@ class ExportWorker(QThread):
                 self.finished.emit(False, "工作区路径不存在")
                 return
 
-            chats = []
-            workspace_path = self.workspace_path
-
-            # 遍历所有工作区文件夹
-            for workspace in os.listdir(workspace_path):
-                db_path = os.path.join(workspace_path, workspace, 'state.vscdb')
-
-                if not os.path.exists(db_path):
-                    continue
-
-                # 连接数据库
-                conn = sqlite3.connect(db_path)
-                cursor = conn.cursor()
-
-                # 获取所有需要的数据
-                cursor.execute("""
-                    SELECT [key], value 
-                    FROM ItemTable 
-                    WHERE [key] IN (
-                        'workbench.panel.aichat.view.aichat.chatdata',
-                        'composer.composerData'
-                    )
-                """)
-
-                for row in cursor.fetchall():
-                    key, value = row
-                    try:
-                        data = json.loads(value)
-                        chats.append({
-                            'workspace': workspace,
-                            'type': key,
-                            'data': data
-                        })
-                    except Exception as e:
-                        continue
-
-                conn.close()
-
-            if not chats:
-                self.finished.emit(False, "没有找到任何聊天记录")
-                return
-
+            self.output_layout = OutputLayout(self.workspace_path, self.layout)
             self.progress.emit("🔍 开始导出...")
 
             # 创建输出目录
-            md_output_dir = 'cursor_chats'
-            os.makedirs(md_output_dir, exist_ok=True)
+            os.makedirs(self.md_output_dir, exist_ok=True)
 
             if self.export_json:
-                json_output_dir = 'cursor_chats_json'
-                os.makedirs(json_output_dir, exist_ok=True)
-
-            # 记录统计信息
-            total_chats = len(chats)
-            total_tabs = 0
-            md_count = 0
-            json_count = 0
-            # 遍历并导出每个对话
-            for chat in chats:
-                if chat['type'] == 'workbench.panel.aichat.view.aichat.chatdata':
-                    data = chat['data']
-                    if 'tabs' in data:
-                        total_tabs += len(data['tabs'])
-                        for tab in data['tabs']:
-                            # 获取对话标题和时间戳
-                            title = tab.get('chatTitle', '')
-                            timestamp = tab.get('lastSendTime', 0)
-                            time_str = format_timestamp(timestamp)
-
-                            if not title:
-                                title = f"Chat_{time_str}"
-
-                            # 清理文件名
-                            safe_title = sanitize_filename(title)
-
-                            # 获取时间戳字符串
-                            time_str = format_timestamp(timestamp) if self.include_timestamp else ""
-
-                            # 处理 Markdown 文件名
-                            md_filename = (f"{time_str}_{safe_title}.md" if time_str
-                                           else f"{safe_title}.md")
-                            md_path = os.path.join(md_output_dir, md_filename)
-
-                            # 导出 Markdown 文件
-                            with open(md_path, 'w', encoding='utf-8') as f:
-                                # 写入标题
-                                f.write(f"# {title}\n\n")
-
-                                # 写入工作区信息
-                                f.write(f"Workspace: `{chat['workspace']}`\n\n")
-
-                                # 写入时间信息
-                                if timestamp:
-                                    f.write(f"Last Updated: {timestamp}\n\n")
-
-                                # 写入对话内容
-                                if 'bubbles' in tab:
-                                    for bubble in tab['bubbles']:
-                                        # 用户消息
-                                        if bubble.get('type') == 'user':
-                                            if 'text' in bubble:
-                                                f.write(f"## User\n\n{bubble['text']}\n\n")
-
-                                            # 添加代码选择
-                                            if bubble.get('selections'):
-                                                f.write("Selected code:\n")
-                                                for selection in bubble['selections']:
-                                                    f.write(f"```{selection.get('uri', {}).get('path', '')}\n")
-                                                    f.write(f"{selection.get('text', '')}\n```\n\n")
-
-                                        # AI消息
-                                        elif bubble.get('type') == 'ai':
-                                            if 'text' in bubble:
-                                                f.write(f"## Assistant\n\n{bubble['text']}\n\n")
-
-                                            # 添加代码块
-                                            if bubble.get('codeBlocks'):
-                                                for code_block in bubble['codeBlocks']:
-                                                    f.write(f"```{code_block.get('language', '')}\n")
-                                                    f.write(f"{code_block.get('code', '')}\n```\n\n")
-
-                            # 可选：导出 JSON 文件
-                            if self.export_json:
-                                json_filename = (f"{time_str}_{safe_title}.json" if time_str
-                                                 else f"{safe_title}.json")
-                                json_path = os.path.join(json_output_dir, json_filename)
-
-                                chat_data = {
-                                    'workspace': chat['workspace'],
-                                    'title': title,
-                                    'lastSendTime': timestamp,
-                                    'bubbles': tab.get('bubbles', [])
-                                }
-
-                                with open(json_path, 'w', encoding='utf-8') as f:
-                                    json.dump(chat_data, f, ensure_ascii=False, indent=2)
-                                json_count += 1
-
-                            md_count += 1
-                            self.progress.emit(f"📝 已导出: {md_count} 个文件...")
-
-            success_msg = f"✨ 导出完成!\n📊 共导出 {md_count} 个 Markdown 文件\n📂 位置: {os.path.abspath(md_output_dir)}"
+                os.makedirs(self.json_output_dir, exist_ok=True)
+
+            # 逐个工作区导出（含全局存储 cursorDiskKV 中的新版对话），失败的工作区被隔离
+            _, quarantined, failed = process_workspaces(self.workspace_path, self.export_tab,
+                                                        self.timeout, self.retries)
+            quarantine_path = write_quarantine(self.md_output_dir, quarantined, failed)
+
+            quarantine_msg = ""
+            if quarantined:
+                quarantine_msg += f"\n⚠️ {len(quarantined)} 个工作区处理失败，已跳过:"
+                for item in quarantined:
+                    quarantine_msg += f"\n   {item['workspace']}: {item['error']}"
+            if failed:
+                quarantine_msg += f"\n⚠️ {len(failed)} 个对话导出失败，已跳过:"
+                for item in failed:
+                    quarantine_msg += f"\n   {item['workspace']}/{item['tabId']}: {item['error']}"
+            if quarantined or failed:
+                quarantine_msg += f"\n📄 详情: {os.path.abspath(quarantine_path)}"
+
+            if not self.md_count:
+                self.finished.emit(False, "没有找到任何聊天记录" + quarantine_msg)
+                return
+
+            success_msg = f"✨ 导出完成!\n📊 共导出 {self.md_count} 个 Markdown 文件\n📂 位置: {os.path.abspath(self.md_output_dir)}"
             if self.export_json:
-                success_msg += f"\n📊 同时导出 {json_count} 个 JSON 文件\n📂 位置: {os.path.abspath(json_output_dir)}"
+                success_msg += f"\n📊 同时导出 {self.json_count} 个 JSON 文件\n📂 位置: {os.path.abspath(self.json_output_dir)}"
+            if self.redactor:
+                redactions = self.redactor.summary()
+                success_msg += f"\n🔒 脱敏 {sum(total for _, total, _ in redactions)} 处敏感信息"
+                for workspace, total, _ in redactions:
+                    success_msg += f"\n   {workspace}: {total}"
+            success_msg += quarantine_msg
 
             self.finished.emit(True, success_msg)
 
@@ -294,7 +239,7 @@ class MainWindow(QMainWindow):
     def initUI(self):
         """初始化UI"""
         self.setWindowTitle('Cursor Chat Exporter 📤')
-        self.setFixedSize(600, 400)
+        self.setFixedSize(600, 480)
 
         # 设置字体，确保支持 emoji
         emoji_font = QFont()
@@ -329,6 +274,32 @@ class MainWindow(QMainWindow):
         self.timestamp_checkbox.setChecked(True)  # 默认选中
         options_layout.addWidget(self.timestamp_checkbox)
 
+        # 目录布局选项
+        layout_layout = QHBoxLayout()
+        layout_layout.addWidget(QLabel('目录布局 🗂️'))
+        self.layout_combo = QComboBox()
+        self.layout_combo.addItem('全部放在一个目录', 'flat')
+        self.layout_combo.addItem('按工作区', 'workspace')
+        self.layout_combo.addItem('按年/月', 'date')
+        self.layout_combo.addItem('按工作区/年/月', 'workspace-date')
+        layout_layout.addWidget(self.layout_combo)
+        layout_layout.addStretch()
+        options_layout.addLayout(layout_layout)
+
+        # 脱敏选项
+        self.redact_checkbox = QCheckBox('导出时脱敏密钥、令牌等敏感信息 🔒')
+        options_layout.addWidget(self.redact_checkbox)
+
+        # 分页选项
+        page_layout = QHBoxLayout()
+        page_layout.addWidget(QLabel('大型对话分页，每页气泡数 (0 为不分页) 📑'))
+        self.page_spinbox = QSpinBox()
+        self.page_spinbox.setRange(0, 100000)
+        self.page_spinbox.setSingleStep(100)
+        page_layout.addWidget(self.page_spinbox)
+        page_layout.addStretch()
+        options_layout.addLayout(page_layout)
+
         layout.addLayout(options_layout)
 
         # 添加菜单栏
@@ -437,7 +408,10 @@ class MainWindow(QMainWindow):
         self.worker = ExportWorker(
             workspace_path=self.workspace_path,
             export_json=self.json_checkbox.isChecked(),
-            include_timestamp=self.timestamp_checkbox.isChecked()
+            include_timestamp=self.timestamp_checkbox.isChecked(),
+            page_bubbles=self.page_spinbox.value(),
+            redact=self.redact_checkbox.isChecked(),
+            layout=self.layout_combo.currentData()
         )
         self.worker.progress.connect(self.log)
         self.worker.finished.connect(self.export_finished)